@@ -31,6 +31,11 @@ class Settings(BaseSettings):
     CACHE_TTL_DAYS: int = 7
     MAX_RESULTS: int = 30
     DOWNLOAD_RETRY_ATTEMPTS: int = 2
+    SEARCH_CONCURRENCY: int = 8
+    DOWNLOAD_CONCURRENCY: int = 3
+    # Общий бюджет запросов к YouTube: не больше N кредитов за окно
+    YOUTUBE_REQUEST_CREDITS: int = 40
+    YOUTUBE_REQUEST_WINDOW_S: float = 10.0
 
     # --- Media Constraints ---
     TRACK_MIN_DURATION_S: int = 60
@@ -1,4 +1,6 @@
 
+import asyncio
+
 import pytest
 import httpx
 from typing import AsyncGenerator
@@ -58,3 +60,85 @@ async def client(test_settings) -> AsyncGenerator[httpx.AsyncClient, None]:
 
     # Очищаем переопределение после теста
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def anyio_backend():
+    """
+    Тесты построены на asyncio (семафоры, shield, run_in_executor). Аргумент
+    backend у маркера anyio в pytestmark плагин anyio 4 игнорирует, поэтому
+    бэкенд фиксируется здесь, иначе тесты запускаются ещё и на trio.
+    """
+    return "asyncio"
+
+
+def _make_track(identifier: str = "dQw4w9WgXcQ", title: str = "Song"):
+    """
+    Создаёт TrackInfo с типовыми метаданными для тестов, которым важен только ID.
+    """
+    from models import Source, TrackInfo
+
+    return TrackInfo(title=title, artist="Artist", duration=200,
+                     source=Source.YOUTUBE.value, identifier=identifier)
+
+
+class FakeYouTube:
+    """
+    Подменяет сетевые шаги YouTubeDownloader (поиск и загрузку через yt-dlp)
+    и записывает вызовы. Кэши, single-flight и breaker работают по-настоящему.
+    """
+
+    def __init__(self, downloader, temp_dir, monkeypatch):
+        self.temp_dir = temp_dir
+        self.searches = []
+        self.downloads = []
+        # Нормализованный запрос -> список TrackInfo; остальные запросы ничего не находят
+        self.results = {}
+        # video_id -> сообщение об ошибке yt-dlp; остальные видео скачиваются успешно
+        self.errors = {}
+        self.delay = 0.0
+        monkeypatch.setattr(downloader, "_search_uncached", self._search_uncached)
+        monkeypatch.setattr(downloader, "_download_uncached", self._download_uncached)
+
+    async def _search_uncached(self, query, limit, search_mode, min_duration, max_duration):
+        self.searches.append(query)
+        await asyncio.sleep(self.delay)
+        return self.results.get(" ".join(query.lower().split()), [])
+
+    async def _download_uncached(self, video_id):
+        from models import DownloadResult
+
+        self.downloads.append(video_id)
+        await asyncio.sleep(self.delay)
+        if video_id in self.errors:
+            return DownloadResult(success=False, error=self.errors[video_id])
+        path = self.temp_dir / f"{video_id}.m4a"
+        path.write_bytes(b"audio")
+        return DownloadResult(success=True, file_path=path, track_info=_make_track(video_id))
+
+
+@pytest.fixture
+def make_track():
+    """
+    Фикстура-фабрика TrackInfo (см. _make_track).
+    """
+    return _make_track
+
+
+@pytest.fixture
+def downloader(test_settings, tmp_path):
+    """
+    Фикстура, создающая YouTubeDownloader с временной директорией для файлов.
+    """
+    from youtube import YouTubeDownloader
+
+    settings = test_settings.model_copy(update={"TEMP_DIR": tmp_path})
+    return YouTubeDownloader(settings)
+
+
+@pytest.fixture
+def fake_youtube(downloader, tmp_path, monkeypatch):
+    """
+    Фикстура, подменяющая обращения downloader к YouTube на FakeYouTube.
+    """
+    return FakeYouTube(downloader, tmp_path, monkeypatch)
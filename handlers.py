@@ -149,7 +149,7 @@ def setup_handlers(app: Application, radio: RadioManager, settings: Settings, do
                     caption=caption,
                     parse_mode=ParseMode.MARKDOWN,
                     # reply_markup=get_track_control_keyboard(download_result.track_info.identifier, is_in_favs), # Re-add if cache_service is integrated
-                    filename=f"{download_result.track_info.artist} - {download_result.track_info.title}.mp3"
+                    filename=f"{download_result.track_info.artist} - {download_result.track_info.title}{download_result.file_path.suffix}"
                 )
             
             await search_msg.delete()
@@ -153,6 +153,7 @@ async def lifespan(app: FastAPI):
     await tg_app.stop()
     await tg_app.shutdown()
     await db_service.close()
+    await downloader.close()
     
     logger.info("✅ Application shutdown complete.")
 
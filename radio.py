@@ -303,7 +303,7 @@ class RadioManager:
                             caption=caption,
                             parse_mode=ParseMode.MARKDOWN,
                             reply_markup=get_dashboard_keyboard(self._settings.BASE_URL, s.chat_type, s.chat_id),
-                            filename=f"{s.current_download_result.track_info.artist} - {s.current_download_result.track_info.title}.mp3"
+                            filename=f"{s.current_download_result.track_info.artist} - {s.current_download_result.track_info.title}{s.current_download_result.file_path.suffix}"
                         )
                     s.dashboard_msg_id = audio_msg.message_id
                     
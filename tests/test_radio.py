@@ -0,0 +1,44 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+pytestmark = pytest.mark.anyio(backend='asyncio')
+
+
+async def test_radio_survives_circuit_breaker_trip(test_settings, downloader, fake_youtube,
+                                                   make_track, monkeypatch):
+    """
+    Проверяет, что один ответ 429 не останавливает радио: следующие треки
+    пережидают открытый breaker, а не засчитываются как ошибки загрузки.
+    """
+    import youtube
+    from radio import RadioManager, RadioSession
+
+    monkeypatch.setattr(youtube, "BREAKER_BASE_COOLDOWN_S", 0.05)
+    monkeypatch.setattr(youtube.random, "uniform", lambda a, b: 0.0)
+    fake_youtube.results["lofi"] = [make_track(f"aaaaaaaaaa{i}", title=f"Song {i}") for i in range(6)]
+    fake_youtube.errors["aaaaaaaaaa0"] = "ERROR: HTTP Error 429: Too Many Requests"
+
+    session = RadioSession(chat_id=1, query="lofi", chat_type="private", search_mode="genre",
+                           mode_end_time=datetime.now() + timedelta(hours=1))
+
+    async def fake_send_audio(**kwargs):
+        # Первый отправленный трек завершает сессию
+        session.stop_event.set()
+        session.skip_event.set()
+        return MagicMock(message_id=10)
+
+    bot = AsyncMock()
+    bot.send_audio.side_effect = fake_send_audio
+    radio = RadioManager(bot, test_settings, downloader, AsyncMock())
+
+    await asyncio.wait_for(radio._radio_loop(session), timeout=5)
+    for task in (session.preload_task, session.animation_task):
+        if task:
+            task.cancel()
+
+    assert bot.send_audio.await_count == 1
+    assert not any("Радио остановлено" in str(c.args) for c in bot.send_message.await_args_list)
+    assert fake_youtube.downloads[:2] == ["aaaaaaaaaa0", "aaaaaaaaaa1"]
@@ -0,0 +1,321 @@
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio(backend='asyncio')
+
+
+def test_find_downloaded_file_prefers_m4a(downloader, tmp_path):
+    """
+    Проверяет, что из нескольких файлов одного видео выбирается M4A,
+    а служебные файлы yt-dlp игнорируются.
+    """
+    for name in ("dQw4w9WgXcQ.webm", "dQw4w9WgXcQ.mp3", "dQw4w9WgXcQ.webp", "other_video.m4a"):
+        (tmp_path / name).write_bytes(b"x")
+
+    assert downloader._find_downloaded_file("dQw4w9WgXcQ") == str(tmp_path / "dQw4w9WgXcQ.mp3")
+
+    (tmp_path / "dQw4w9WgXcQ.m4a").write_bytes(b"x")
+    assert downloader._find_downloaded_file("dQw4w9WgXcQ") == str(tmp_path / "dQw4w9WgXcQ.m4a")
+
+
+def test_find_downloaded_file_skips_sidecars(downloader, tmp_path):
+    """
+    Проверяет, что при наличии только служебных файлов ничего не находится.
+    """
+    for name in ("dQw4w9WgXcQ.webm.part", "dQw4w9WgXcQ.jpg"):
+        (tmp_path / name).write_bytes(b"x")
+
+    assert downloader._find_downloaded_file("dQw4w9WgXcQ") is None
+
+
+@pytest.mark.parametrize("error, expected", [
+    ("ERROR: HTTP Error 503: Service Unavailable", "throttle"),
+    ("Sign in to confirm you're not a bot", "throttle"),
+    ("File is larger than max-filesize (60000000 bytes > 52428800 bytes)", "too_big"),
+    ("ERROR: [youtube] dQw4w9WgXcQ: Video unavailable", "permanent"),
+    ("ERROR: [youtube] 429-abcdefg: Video unavailable", "permanent"),
+    ("ERROR: HTTP Error 429: Too Many Requests", "throttle"),
+    ("ERROR: [youtube] dQw4w9WgXcQ: Private video. Sign in if you've been granted access", "permanent"),
+    ("Sign in to confirm your age. This video may be inappropriate", "permanent"),
+    ("ERROR: [youtube] dQw4w9WgXcQ: Requested format is not available", "permanent"),
+    ("ERROR: unable to download video data: timed out", None),
+    (None, None),
+])
+def test_classify_error(error, expected):
+    """
+    Проверяет классификацию сообщений об ошибках yt-dlp.
+    """
+    from youtube import _classify_error
+
+    assert _classify_error(error) == expected
+
+
+@pytest.mark.parametrize("title, banned", [
+    ("Lofi Hip Hop 10 Hours", True),
+    ("Best Synthwave Mix 2024", True),
+    ("Daft Punk - Full Album", True),
+    ("Artist - Song (Remix)", False),
+    ("Artist - Song (Official Audio)", False),
+])
+def test_track_banned_title_re(title, banned):
+    """
+    Проверяет, что стоп-слова учитывают границы слов и не ловят 'remix'.
+    """
+    from youtube import _TRACK_BANNED_TITLE_RE
+
+    assert bool(_TRACK_BANNED_TITLE_RE.search(title)) is banned
+
+
+async def test_banned_titles_filtered_only_in_track_mode(downloader):
+    """
+    Проверяет, что стоп-слова отсекают сборники только при поиске трека,
+    а в режимах жанра и артиста миксы остаются в выдаче.
+    """
+    entries = [
+        {"id": "aaaaaaaaaa1", "title": "Artist - Song", "uploader": "Artist", "duration": 200},
+        {"id": "aaaaaaaaaa2", "title": "Best Synthwave Mix 2024", "uploader": "Artist", "duration": 200},
+    ]
+    downloader._extract_info = lambda ydl_opts, overrides, url, download: {"entries": entries}
+
+    track = await downloader._search_uncached("synthwave", 5, "track", None, None)
+    genre = await downloader._search_uncached("synthwave", 5, "genre", None, None)
+
+    assert [t.identifier for t in track] == ["aaaaaaaaaa1"]
+    assert [t.identifier for t in genre] == ["aaaaaaaaaa1", "aaaaaaaaaa2"]
+
+
+async def test_resolve_video_id_single_flight_and_alias(downloader, fake_youtube, make_track):
+    """
+    Проверяет, что одинаковые запросы (с точностью до регистра и пробелов)
+    приводят к одному поиску, а повторный запрос берётся из кэша.
+    """
+    fake_youtube.results["queen bohemian rhapsody"] = [make_track()]
+    fake_youtube.delay = 0.01
+
+    first, second = await asyncio.gather(
+        downloader._resolve_video_id("Queen  Bohemian Rhapsody"),
+        downloader._resolve_video_id("queen bohemian rhapsody"),
+    )
+    third = await downloader._resolve_video_id("QUEEN bohemian rhapsody")
+
+    assert first == second == third == "dQw4w9WgXcQ"
+    assert len(fake_youtube.searches) == 1
+
+
+async def test_search_cache_reuses_results(downloader, fake_youtube, make_track):
+    """
+    Проверяет, что повторный поиск с тем же нормализованным запросом не идёт в yt-dlp,
+    а пустой результат не кэшируется.
+    """
+    fake_youtube.results["lofi"] = [make_track()]
+
+    assert len(await downloader.search("lofi", limit=5)) == 1
+    assert len(await downloader.search("  LOFI ", limit=5)) == 1
+    assert await downloader.search("nothing", limit=5) == []
+    assert await downloader.search("nothing", limit=5) == []
+
+    assert fake_youtube.searches == ["lofi", "nothing", "nothing"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("dQw4w9WgXcQ", True),
+    ("a-b_c1234XY", True),
+    ("dQw4w9WgXc", False),
+    ("queen songs", False),
+    ("dQw4w9WgX?Q", False),
+])
+def test_is_video_id(value, expected):
+    """
+    Проверяет распознавание ID видео YouTube.
+    """
+    from youtube import _is_video_id
+
+    assert _is_video_id(value) is expected
+
+
+async def test_request_budget_waits_for_refill():
+    """
+    Проверяет, что бюджет запросов пропускает запросы в пределах ёмкости сразу,
+    а при исчерпании ждёт пополнения.
+    """
+    import time
+
+    from youtube import _RequestBudget
+
+    budget = _RequestBudget(capacity=4, window_s=0.2)
+    start = time.monotonic()
+    await budget.acquire(2)
+    await budget.acquire(2)
+    assert time.monotonic() - start < 0.05
+
+    await budget.acquire(2)
+    assert time.monotonic() - start >= 0.09
+
+
+async def test_download_coalesces_concurrent_calls(downloader, fake_youtube):
+    """
+    Проверяет, что одновременные загрузки одного видео выполняются один раз.
+    """
+    fake_youtube.errors["dQw4w9WgXcQ"] = "boom"
+    fake_youtube.delay = 0.01
+
+    first, second = await asyncio.gather(
+        downloader.download("dQw4w9WgXcQ"),
+        downloader.download("dQw4w9WgXcQ"),
+    )
+    await downloader.download("dQw4w9WgXcQ")
+
+    assert first is second
+    assert fake_youtube.downloads == ["dQw4w9WgXcQ", "dQw4w9WgXcQ"]
+
+
+async def test_download_remembers_permanent_failures(downloader, fake_youtube):
+    """
+    Проверяет, что постоянная ошибка загрузки запоминается,
+    а временная — нет.
+    """
+    fake_youtube.errors.update({
+        "dQw4w9WgXcQ": "ERROR: [youtube] dQw4w9WgXcQ: Video unavailable",
+        "a-b_c1234XY": "ERROR: unable to download video data: timed out",
+    })
+
+    for _ in range(2):
+        await downloader.download("dQw4w9WgXcQ")
+        await downloader.download("a-b_c1234XY")
+
+    assert fake_youtube.downloads == ["dQw4w9WgXcQ", "a-b_c1234XY", "a-b_c1234XY"]
+
+
+def test_check_deadline_cancels_late_downloads(downloader):
+    """
+    Проверяет, что progress hook прерывает загрузку после истечения срока.
+    """
+    import time
+
+    import yt_dlp
+
+    downloader._ydl_local.deadline = time.monotonic() + 60
+    downloader._check_deadline({"status": "downloading"})
+
+    downloader._ydl_local.deadline = time.monotonic() - 1
+    downloader._check_deadline({"status": "finished"})
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        downloader._check_deadline({"status": "downloading"})
+
+
+def test_cancelled_download_removes_partial_files(downloader, tmp_path):
+    """
+    Проверяет, что после прерывания по сроку недокачанные файлы видео удаляются,
+    а файлы других видео остаются.
+    """
+    import yt_dlp
+
+    def fake_extract_info(ydl_opts, overrides, url, download):
+        for name in ("dQw4w9WgXcQ.f251.webm.part", "dQw4w9WgXcQ.webm.part-Frag3", "dQw4w9WgXcQ.webm.ytdl"):
+            (tmp_path / name).write_bytes(b"x")
+        raise yt_dlp.utils.DownloadCancelled("Download timed out")
+
+    (tmp_path / "other_video.webm.part").write_bytes(b"x")
+    downloader._extract_info = fake_extract_info
+
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        downloader._download_sync({}, "dQw4w9WgXcQ")
+
+    assert [p.name for p in tmp_path.iterdir()] == ["other_video.webm.part"]
+
+
+async def test_search_serves_stale_cache_while_throttled(downloader, fake_youtube, make_track):
+    """
+    Проверяет, что при открытом circuit breaker устаревший результат поиска
+    возвращается из кэша без обращения к YouTube.
+    """
+    import time
+
+    fake_youtube.results["lofi"] = [make_track()]
+
+    await downloader.search("lofi", limit=5)
+    key = next(iter(downloader._search_cache))
+    downloader._search_cache[key] = (time.monotonic() - 1, downloader._search_cache[key][1])
+
+    downloader._breaker_until = time.monotonic() + 60
+    assert len(await downloader.search("lofi", limit=5)) == 1
+    assert fake_youtube.searches == ["lofi"]
+
+    downloader._breaker_until = 0.0
+    await downloader.search("lofi", limit=5)
+    assert fake_youtube.searches == ["lofi", "lofi"]
+
+
+async def test_permanent_failure_drops_query_alias(downloader, fake_youtube, make_track):
+    """
+    Проверяет, что после постоянной ошибки запрос не ведёт на то же видео:
+    алиас сбрасывается, а повторный поиск выбирает другую загрузку.
+    """
+    fake_youtube.results["artist song"] = [make_track("deadVideo01"), make_track("goodVideo01")]
+    fake_youtube.errors["deadVideo01"] = "ERROR: [youtube] deadVideo01: Video unavailable"
+
+    first = await downloader.download_with_retry("Artist Song")
+    assert not first.success
+    assert "artist song" not in downloader._query_aliases
+
+    second = await downloader.download_with_retry("artist  song")
+    assert second.success
+    assert fake_youtube.downloads == ["deadVideo01", "goodVideo01"]
+    assert downloader._query_aliases["artist song"][1] == "goodVideo01"
+
+
+async def test_download_waits_out_circuit_breaker(downloader, fake_youtube, monkeypatch):
+    """
+    Проверяет, что 429/503 при прямом вызове download() (как у радио) открывает
+    breaker: download() пережидает паузу, /play отвечает сразу, а слишком
+    долгая пауза приводит к отказу без обращения к YouTube.
+    """
+    import time
+
+    import youtube
+
+    monkeypatch.setattr(youtube, "BREAKER_BASE_COOLDOWN_S", 0.05)
+    monkeypatch.setattr(youtube.random, "uniform", lambda a, b: 0.0)
+    fake_youtube.errors["dQw4w9WgXcQ"] = "ERROR: HTTP Error 429: Too Many Requests"
+
+    await downloader.download("dQw4w9WgXcQ")
+    assert downloader._breaker_until > time.monotonic()
+
+    retried = await downloader.download_with_retry("a-b_c1234XY")
+    assert not retried.success and "cooldown" in retried.error
+    assert fake_youtube.downloads == ["dQw4w9WgXcQ"]
+
+    start = time.monotonic()
+    waited = await downloader.download("a-b_c1234XY")
+    assert waited.success
+    assert time.monotonic() - start >= 0.04
+    assert fake_youtube.downloads == ["dQw4w9WgXcQ", "a-b_c1234XY"]
+
+    downloader._breaker_until = time.monotonic() + youtube.BREAKER_MAX_WAIT_S + 60
+    blocked = await downloader.download("aaaaaaaaaa1")
+    assert not blocked.success and "cooldown" in blocked.error
+    assert fake_youtube.downloads == ["dQw4w9WgXcQ", "a-b_c1234XY"]
+
+
+async def test_coalesced_download_gives_each_caller_own_file(downloader, fake_youtube, tmp_path):
+    """
+    Проверяет, что при совместной загрузке каждый вызывающий получает свой файл:
+    удаление файла одним чатом не мешает другому, а общий файл не остаётся в TEMP_DIR.
+    """
+    fake_youtube.delay = 0.01
+
+    first, second = await asyncio.gather(
+        downloader.download("dQw4w9WgXcQ"),
+        downloader.download("dQw4w9WgXcQ"),
+    )
+
+    assert first.file_path != second.file_path
+    assert not (tmp_path / "dQw4w9WgXcQ.m4a").exists()
+
+    first.file_path.unlink()
+    assert second.file_path.read_bytes() == b"audio"
+    second.file_path.unlink()
+
+    assert list(tmp_path.iterdir()) == []
+    assert downloader._downloading == {} and downloader._download_waiters == {}
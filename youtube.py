@@ -1,9 +1,19 @@
 from __future__ import annotations
 import asyncio
+import functools
+import itertools
 import logging
 import os
-import glob  # Added glob
+import random
 import re
+import shutil
+import socket
+import string
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Literal
 
@@ -16,6 +26,187 @@ from models import DownloadResult, Source, TrackInfo # Removed StreamInfoResult,
 
 logger = logging.getLogger(__name__)
 
+SearchMode = Literal['track', 'artist', 'genre']
+
+# --- DNS cache ---
+# yt-dlp резолвит www.youtube.com / *.googlevideo.com на каждый HTTP-запрос
+# (десятки раз на одно видео). Кэшируем ответы getaddrinfo только для хостов
+# YouTube и на короткое время, чтобы CDN-адреса не устаревали; остальные
+# хосты (Telegram API, health-check) резолвятся как обычно.
+DNS_CACHE_TTL_S = 300
+DNS_CACHE_MAX_SIZE = 512
+DNS_CACHED_DOMAINS = ('youtube.com', 'googlevideo.com', 'ytimg.com', 'ggpht.com')
+
+_dns_cache: Dict[tuple, tuple] = {}
+_dns_cache_lock = threading.Lock()
+
+
+def _is_youtube_host(host) -> bool:
+    if not isinstance(host, str):
+        return False
+    return any(host == d or host.endswith('.' + d) for d in DNS_CACHED_DOMAINS)
+
+
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    if not _is_youtube_host(host):
+        return _original_getaddrinfo(host, port, *args, **kwargs)
+
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    cached = _dns_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    result = _original_getaddrinfo(host, port, *args, **kwargs)
+    with _dns_cache_lock:
+        if len(_dns_cache) >= DNS_CACHE_MAX_SIZE:
+            # Вытесняем самую старую запись (dict сохраняет порядок вставки)
+            _dns_cache.pop(next(iter(_dns_cache)), None)
+        _dns_cache[key] = (now + DNS_CACHE_TTL_S, result)
+    return result
+
+
+# При повторном импорте модуля берём исходную функцию, а не обёртку, чтобы не
+# оборачивать getaddrinfo дважды
+_original_getaddrinfo = getattr(socket.getaddrinfo, '__wrapped__', socket.getaddrinfo)
+_cached_getaddrinfo.__wrapped__ = _original_getaddrinfo
+socket.getaddrinfo = _cached_getaddrinfo
+
+# --- Retry / circuit breaker ---
+RETRY_BASE_DELAY_S = 2.0
+RETRY_MAX_DELAY_S = 30.0
+# После ответа 503/429 все загрузки ждут, чтобы не добивать rate limiter YouTube
+BREAKER_BASE_COOLDOWN_S = 5.0
+BREAKER_MAX_COOLDOWN_S = 60.0
+# Загрузки пережидают открытый breaker, а не падают: радио считает каждую ошибку
+# и останавливается после трёх подряд. Отказ — только если ждать дольше этого
+BREAKER_MAX_WAIT_S = 90.0
+# socket_timeout ловит только зависший сокет; медленная «капающая» загрузка
+# прерывается по общему сроку, иначе она держит поток пула и слот семафора
+DOWNLOAD_DEADLINE_S = 300
+
+# Стоимость операций в общем бюджете запросов: загрузка делает заметно
+# больше HTTP-запросов к YouTube, чем плоский поиск
+SEARCH_REQUEST_CREDITS = 3
+DOWNLOAD_REQUEST_CREDITS = 10
+
+# Файл cookies может появиться после старта (его пишет lifespan в main.py)
+COOKIES_RECHECK_INTERVAL_S = 60.0
+
+# Заголовки, которые почти никогда не являются одиночным треком (сборники,
+# многочасовые видео, AI-каверы и круглосуточные трансляции). Применяются
+# только в режиме 'track'
+TRACK_BANNED_TITLE_PHRASES = (
+    'ai cover', 'suno', 'udio',
+    '10 hours', '1 hour', 'full album', 'playlist', 'compilation',
+    'live radio', '24/7',
+)
+# Один скомпилированный паттерн вместо цикла по списку; границы слов
+# не дают 'mix' совпасть с 'remix'
+_TRACK_BANNED_TITLE_RE = re.compile(
+    r"\b(?:" + "|".join(map(re.escape, TRACK_BANNED_TITLE_PHRASES)) + r"|mix \d+)\b",
+    re.IGNORECASE,
+)
+
+# Дополнения к поисковому запросу по режиму: для жанров ищем "official audio"
+# ради лучшего качества
+_SEARCH_QUERY_SUFFIXES = {'genre': ' official audio'}
+
+# Радио и веб-плеер часто повторяют один и тот же поиск в течение минут
+SEARCH_CACHE_TTL_S = 120
+SEARCH_CACHE_MAX_SIZE = 256
+
+# Повторные /play с тем же текстом не должны заново искать на YouTube
+QUERY_ALIAS_TTL_S = 86400
+QUERY_ALIAS_MAX_SIZE = 1024
+
+# Видео с постоянной ошибкой (удалено, закрыто, нет подходящего формата) не
+# запрашиваем повторно, пока не истечёт срок — радио и /play часто просят его снова
+FAILED_DOWNLOAD_TTL_S = 600
+FAILED_DOWNLOAD_MAX_SIZE = 1024
+
+# Классификация ошибок yt-dlp одним проходом вместо цепочки `in str(e)`
+_ERROR_RE = re.compile(
+    r"(?P<too_big>max-filesize|file is larger|too large)"
+    r"|(?P<throttle>HTTP Error (?:429|503)|not a bot)"
+    r"|(?P<permanent>video unavailable|video is not available|private video|has been removed"
+    r"|members[- ]only|copyright|not available in your country|geo[- ]?restrict"
+    r"|confirm your age|age[- ]restricted|live streams are not supported"
+    r"|requested format is not available)",
+    re.IGNORECASE,
+)
+
+
+def _classify_error(error: Optional[str]) -> Optional[str]:
+    """Returns 'too_big', 'throttle', 'permanent' or None for a yt-dlp error message."""
+    match = _ERROR_RE.search(error) if error else None
+    return match.lastgroup if match else None
+
+
+def _normalize_query(query: str) -> str:
+    """Lowercases a query and collapses whitespace for use as a cache key."""
+    return ' '.join(query.lower().split())
+
+
+@functools.lru_cache(maxsize=32)
+def _search_match_filter(min_duration: Optional[int], max_duration: Optional[int]):
+    """Builds (once per bounds) a yt-dlp match_filter that drops live and out-of-range entries."""
+    conditions = ['!is_live']
+    if min_duration:
+        conditions.append(f'duration >= {min_duration}')
+    if max_duration:
+        conditions.append(f'duration <= {max_duration}')
+    return yt_dlp.utils.match_filter_func(' & '.join(conditions))
+
+
+_YT_ID_ALPHABET = frozenset(string.ascii_letters + string.digits + '_-')
+
+
+def _is_video_id(value: str) -> bool:
+    """Checks whether a string is a bare 11-character YouTube video id."""
+    # Проверка длины отсекает почти все текстовые запросы; для 11 символов
+    # frozenset.issuperset быстрее входа в regex и не создаёт Match
+    return len(value) == 11 and _YT_ID_ALPHABET.issuperset(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def _video_url(video_id: str) -> str:
+    """Returns the interned watch URL for a video id (radio re-requests the same ids often)."""
+    return sys.intern(f"https://www.youtube.com/watch?v={video_id}")
+
+
+# Приоритет расширений при выборе скачанного файла (меньше — лучше)
+_FILE_EXT_PRIORITY = {'.m4a': 0, '.mp3': 1, '.webm': 2}
+# Форматы, которые можно отправить в Telegram как аудио
+_AUDIO_EXTENSIONS = ('.m4a', '.mp3')
+# Служебные файлы yt-dlp, которые не являются аудио
+_SIDECAR_EXTENSIONS = frozenset({'.part', '.ytdl', '.json', '.webp', '.jpg', '.png'})
+
+class _RequestBudget:
+    """Token bucket shared by searches and downloads: `capacity` credits refill over `window_s` seconds."""
+
+    def __init__(self, capacity: int, window_s: float):
+        self._capacity = float(capacity)
+        self._rate = capacity / window_s
+        self._credits = self._capacity
+        self._updated = time.monotonic()
+        # Ожидающие обслуживаются по очереди, крупная загрузка не голодает из-за поисков
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cost: int):
+        """Waits until `cost` credits are available and spends them."""
+        cost = min(cost, self._capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._credits = min(self._capacity, self._credits + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._credits >= cost:
+                    self._credits -= cost
+                    return
+                await asyncio.sleep((cost - self._credits) / self._rate)
+
+
 # Define SilentLogger
 class SilentLogger:
     """A silent logger that discards all messages."""
@@ -31,124 +222,439 @@ class YouTubeDownloader:
         self._settings = settings
         self._temp_dir = settings.TEMP_DIR # Changed from settings.DOWNLOADS_DIR
         self._temp_dir.mkdir(parents=True, exist_ok=True)
+        # Строковая форма пути для горячих мест, чтобы не гонять Path через os.fspath
+        self._temp_dir_str = str(self._temp_dir)
+        self._breaker_until = 0.0  # time.monotonic(), до которого загрузки отклоняются
+        self._breaker_trips = 0  # срабатывания подряд без успешной загрузки
+        
+        # Раздельные лимиты: медленные загрузки не должны блокировать быстрый поиск
+        self._search_semaphore = asyncio.Semaphore(settings.SEARCH_CONCURRENCY)
+        self._download_semaphore = asyncio.Semaphore(settings.DOWNLOAD_CONCURRENCY)
+        # Семафоры ограничивают одновременность, бюджет — частоту запросов к YouTube,
+        # чтобы поиск и загрузки вместе не упирались в 429/503
+        self._request_budget = _RequestBudget(
+            settings.YOUTUBE_REQUEST_CREDITS, settings.YOUTUBE_REQUEST_WINDOW_S
+        )
+        # Собственный пул потоков для yt-dlp: размер совпадает с суммой лимитов,
+        # и блокирующие вызовы не конкурируют с default executor остальных модулей
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.SEARCH_CONCURRENCY + settings.DOWNLOAD_CONCURRENCY,
+            thread_name_prefix="ytdl",
+        )
         
         # Опции для поиска
         self._search_opts = {
             'quiet': True,
             'no_warnings': True,
-            'extract_flat': True,
+            # Плоский список результатов: страницы отдельных видео не запрашиваются
+            'extract_flat': 'in_playlist',
+            # Записи обрабатываются по мере получения страниц, а не после загрузки всего списка
+            'lazy_playlist': True,
             'skip_download': True,
+            # Поиск — короткий запрос: зависший сокет не должен держать поток пула
+            'socket_timeout': 15,
             'logger': SilentLogger(), # Added for consistency
             'retries': 3,
             'fragment_retries': 3,
             "geo_bypass": True,
             "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            'extractor_args': {
+                'youtube': {'player_skip': ['configs', 'webpage', 'js']},
+                'youtubetab': {'skip': ['authcheck']},
+            },
         }
         
-        # Опции для скачивания с конвертацией в MP3
+        self._max_filesize = self._settings.PLAY_MAX_FILE_SIZE_MB * 1024 * 1024
+        
+        # Опции для скачивания в M4A: Telegram принимает M4A как аудио, а AAC-дорожка
+        # YouTube сохраняется без перекодирования (ffmpeg нужен только для opus/webm)
         self._download_opts = {
             'quiet': True,
             'no_warnings': True,
-            'format': 'bestaudio/best',
-            'outtmpl': str(self._temp_dir / '%(id)s.%(ext)s'),
+            'format': 'bestaudio[ext=m4a]/bestaudio/best',
+            'outtmpl': os.path.join(self._temp_dir_str, '%(id)s.%(ext)s'),
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
+                'preferredcodec': 'm4a',
                 'preferredquality': '192',
             }],
-            'max_filesize': self._settings.PLAY_MAX_FILE_SIZE_MB * 1024 * 1024, # Used settings directly
+            'max_filesize': self._max_filesize,
+            # Размер выбранного формата известен из тех же метаданных, поэтому
+            # слишком большие файлы и трансляции отклоняются до передачи байтов
+            'match_filter': yt_dlp.utils.match_filter_func(
+                f'filesize <? {self._max_filesize} & filesize_approx <? {self._max_filesize} & !is_live'
+            ),
             'socket_timeout': 30,
+            'progress_hooks': [self._check_deadline],
             'logger': SilentLogger(), # Added for consistency
             'retries': 3,
             'fragment_retries': 3,
             "geo_bypass": True,
             "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            # Нужен только аудиофайл: никаких побочных файлов и лишних запросов
+            'writeinfojson': False,
+            'writethumbnail': False,
+            'writesubtitles': False,
+            'writeautomaticsub': False,
+            # Клиент android не требует загрузки и разбора JS-плеера; манифесты
+            # HLS/DASH не запрашиваются — аудиоформаты приходят в ответе плеера
+            'extractor_args': {
+                'youtube': {
+                    'player_client': ['android'],
+                    'player_skip': ['configs', 'webpage'],
+                    'skip': ['hls', 'dash'],
+                },
+            },
         }
         
         # Добавляем cookies если есть
+        self._cookies_checked_at = time.monotonic()
+        self._refresh_cookiefile()
+        
+        # Экземпляры YoutubeDL переиспользуются: у каждого потока пула свой
+        # экземпляр на профиль опций (YoutubeDL не потокобезопасен), поэтому
+        # блокировка не сериализует параллельные загрузки
+        self._ydl_local = threading.local()
+        self._ydl_instances: List[yt_dlp.YoutubeDL] = []
+        self._ydl_instances_lock = threading.Lock()
+        
+        # Нормализованный запрос -> (срок годности, video_id) и запросы в процессе поиска
+        self._query_aliases: Dict[str, tuple] = {}
+        self._resolving: Dict[str, asyncio.Future] = {}
+        # LRU-кэш результатов поиска: ключ -> (срок годности, треки)
+        self._search_cache: OrderedDict = OrderedDict()
+        self._searching: Dict[tuple, asyncio.Future] = {}
+        # Загрузки в процессе: video_id -> future с DownloadResult
+        self._downloading: Dict[str, asyncio.Future] = {}
+        # Сколько вызовов ждут каждую загрузку: общий файл удаляет последний из них
+        self._download_waiters: Dict[str, int] = {}
+        self._copy_ids = itertools.count(1)
+        # Негативный кэш: video_id -> (срок годности, DownloadResult с постоянной ошибкой)
+        self._failed_downloads: OrderedDict = OrderedDict()
+
+    def _refresh_cookiefile(self):
+        """Adds or removes the cookiefile option depending on whether the file exists."""
         if self._settings.COOKIES_FILE and self._settings.COOKIES_FILE.exists():
             self._download_opts['cookiefile'] = str(self._settings.COOKIES_FILE)
             self._search_opts['cookiefile'] = str(self._settings.COOKIES_FILE)
+        else:
+            self._download_opts.pop('cookiefile', None)
+            self._search_opts.pop('cookiefile', None)
+
+    def _get_opts(self, is_search: bool) -> Dict[str, Any]:
+        """Returns the prebuilt yt-dlp options; the cookies file is re-checked at most once per interval."""
+        now = time.monotonic()
+        if now - self._cookies_checked_at > COOKIES_RECHECK_INTERVAL_S:
+            self._cookies_checked_at = now
+            self._refresh_cookiefile()
+        return self._search_opts if is_search else self._download_opts
+
+    def _get_ydl(self, ydl_opts: Dict[str, Any]) -> yt_dlp.YoutubeDL:
+        """Returns the calling thread's YoutubeDL for an options profile, rebuilding it when cookies change."""
+        cache = getattr(self._ydl_local, 'instances', None)
+        if cache is None:
+            # Профиль опций (id prebuilt-словаря) -> (cookiefile, YoutubeDL) этого потока
+            cache = self._ydl_local.instances = {}
+        cookiefile = ydl_opts.get('cookiefile')
+        cached = cache.get(id(ydl_opts))
+        if cached is not None and cached[0] == cookiefile:
+            return cached[1]
+        
+        # YoutubeDL хранит переданный dict как self.params — отдаём копию,
+        # чтобы переопределения одного потока не попадали в общие опции
+        ydl = yt_dlp.YoutubeDL(dict(ydl_opts))
+        cache[id(ydl_opts)] = (cookiefile, ydl)
+        with self._ydl_instances_lock:
+            if cached is not None:
+                self._ydl_instances.remove(cached[1])
+            self._ydl_instances.append(ydl)
+        if cached is not None:
+            cached[1].close()
+        return ydl
+
+    def _extract_info(
+        self,
+        ydl_opts: Dict[str, Any],
+        overrides: Optional[Dict[str, Any]],
+        url: str,
+        download: bool,
+    ) -> Optional[Dict[str, Any]]:
+        """Runs extract_info on a reused YoutubeDL; meant to be called in the executor."""
+        ydl = self._get_ydl(ydl_opts)
+        if overrides:
+            ydl.params.update(overrides)
+        return ydl.extract_info(url, download=download)
+
+    def _check_deadline(self, status: Dict[str, Any]):
+        """yt-dlp progress hook: cancels a download that runs past its deadline."""
+        if status.get('status') == 'downloading' and time.monotonic() > self._ydl_local.deadline:
+            raise yt_dlp.utils.DownloadCancelled(f"Download timed out after {DOWNLOAD_DEADLINE_S}s")
+
+    def _download_sync(self, ydl_opts: Dict[str, Any], video_id: str) -> tuple:
+        """Downloads a video and locates the result; returns (info, file path, file size)."""
+        # Срок хранится в thread-local: хук вызывается в потоке, выполняющем загрузку
+        self._ydl_local.deadline = time.monotonic() + DOWNLOAD_DEADLINE_S
+        # extract_info(download=True) уже возвращает полные метаданные, второй запрос не нужен
+        try:
+            info = self._extract_info(ydl_opts, None, _video_url(video_id), True)
+        except yt_dlp.utils.DownloadCancelled:
+            # Прерванная загрузка оставляет .part/.ytdl, которые иначе копятся в TEMP_DIR
+            self._remove_partial_files(video_id)
+            raise
+        if not info:
+            return None, None, 0
+        file_path = self._find_downloaded_file(video_id)
+        return info, file_path, os.path.getsize(file_path) if file_path else 0
+
+    def _remove_partial_files(self, video_id: str):
+        """Deletes yt-dlp's unfinished files (.part, .part-FragN, .ytdl) for video_id."""
+        prefix = video_id + '.'
+        with os.scandir(self._temp_dir_str) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(prefix) and ('.part' in name or name.endswith('.ytdl')):
+                    try:
+                        os.remove(entry.path)
+                    except OSError as e:
+                        logger.warning("[Download] Could not remove partial file %s: %s", name, e)
+
+    async def close(self):
+        """Shuts down the yt-dlp thread pool and closes cached YoutubeDL instances."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._ydl_instances_lock:
+            instances, self._ydl_instances = self._ydl_instances, []
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception as e:
+                logger.warning("Error closing YoutubeDL instance: %s", e)
+        logger.info("YouTube downloader stopped.")
 
     async def search(
         self,
         query: str,
         limit: int = 30,
-        search_mode: Literal['track', 'artist', 'genre'] = 'genre', # Used Literal directly
+        search_mode: SearchMode = 'genre',
         min_duration: Optional[int] = None,
         max_duration: Optional[int] = None,
     ) -> List[TrackInfo]:
-        """Search for tracks on YouTube."""
-        logger.info(f"[Search] Запуск поиска для: '{query}' (режим: {search_mode})")
+        """Search for tracks on YouTube, serving repeated queries from a short-lived cache."""
+        key = (_normalize_query(query), limit, search_mode, min_duration, max_duration)
+        cached = self._search_cache.get(key)
+        now = time.monotonic()
+        # Пока YouTube ограничивает нас (breaker открыт), устаревший результат
+        # лучше нового запроса, который только продлит блокировку
+        if cached and (cached[0] > now or now < self._breaker_until):
+            self._search_cache.move_to_end(key)
+            return list(cached[1])
         
-        ydl_opts = self._search_opts.copy()
-        if search_mode == 'genre':
-            # Для жанров ищем "official audio" для лучшего качества
-            query += " official audio"
+        # Одинаковые одновременные поиски (радио в нескольких чатах) ждут один запрос
+        future = self._searching.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._search_uncached(query, limit, search_mode, min_duration, max_duration)
+            )
+            self._searching[key] = future
+            future.add_done_callback(lambda _: self._searching.pop(key, None))
+        tracks = await asyncio.shield(future)
+        
+        # Пустой результат может быть сетевой ошибкой — его не кэшируем
+        if tracks:
+            self._search_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL_S, tracks)
+            self._search_cache.move_to_end(key)
+            if len(self._search_cache) > SEARCH_CACHE_MAX_SIZE:
+                self._search_cache.popitem(last=False)
+        return list(tracks)
+
+    async def _search_uncached(
+        self,
+        query: str,
+        limit: int,
+        search_mode: SearchMode,
+        min_duration: Optional[int],
+        max_duration: Optional[int],
+    ) -> List[TrackInfo]:
+        """Runs the actual yt-dlp search and filters its entries."""
+        logger.info("[Search] Запуск поиска для: '%s' (режим: %s)", query, search_mode)
+        
+        ydl_opts = self._get_opts(is_search=True)
+        # Длительность и трансляции отсекает сам yt-dlp до материализации записей
+        overrides = {'match_filter': _search_match_filter(min_duration, max_duration)}
+        search_url = f"ytsearch{limit}:{query}{_SEARCH_QUERY_SUFFIXES.get(search_mode, '')}"
         
         try:
             loop = asyncio.get_event_loop()
-            search_url = f"ytsearch{limit}:{query}"
             
-            def extract():
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    return ydl.extract_info(search_url, download=False)
-            
-            info = await loop.run_in_executor(None, extract)
+            await self._request_budget.acquire(SEARCH_REQUEST_CREDITS)
+            async with self._search_semaphore:
+                info = await loop.run_in_executor(self._executor, self._extract_info, ydl_opts, overrides, search_url, False)
             
             if not info or 'entries' not in info:
-                logger.warning(f"[Search] Поиск для '{query}' не вернул результатов")
+                logger.warning("[Search] Поиск для '%s' не вернул результатов", query)
                 return []
             
             tracks = []
             for entry in info['entries']:
-                if not entry:
+                # Сначала самые дешёвые проверки: флаг трансляции и числа,
+                # строки трогаем только для прошедших записей
+                if not entry or entry.get('is_live'):
                     continue
                 
                 # Фильтрация по длительности
-                duration = entry.get('duration', 0)
+                duration = int(entry.get('duration') or 0)
                 if min_duration and duration < min_duration:
                     continue
                 if max_duration and duration > max_duration:
                     continue
                 
+                video_id = entry.get('id')
+                if not video_id or not _is_video_id(video_id):
+                    continue
+                
+                title = entry.get('title') or 'Unknown'
+                # Для жанров и артистов миксы и сборники — законный результат
+                banned = search_mode == 'track' and _TRACK_BANNED_TITLE_RE.search(title)
+                if banned:
+                    logger.debug("[Search] Пропущен по стоп-слову '%s': %s", banned.group(0), title)
+                    continue
+                
                 track = TrackInfo(
-                    title=entry.get('title', 'Unknown'),
+                    title=title,
                     artist=entry.get('uploader', 'Unknown'),
                     duration=duration,
                     source=Source.YOUTUBE.value,
-                    identifier=entry.get('id'),
+                    identifier=video_id,
                     view_count=entry.get('view_count'),
                     like_count=entry.get('like_count'),
                 )
                 tracks.append(track)
             
-            logger.info(f"[Search] Найдено и отфильтровано: {len(tracks)} треков.")
+            logger.info("[Search] Найдено и отфильтровано: %d треков.", len(tracks))
             return tracks
             
         except Exception as e:
-            logger.error(f"[Search] Ошибка поиска для '{query}': {e}", exc_info=True)
+            logger.error("[Search] Ошибка поиска для '%s': %s", query, e, exc_info=True)
             return []
 
+    def _recent_failure(self, video_id: str) -> Optional[DownloadResult]:
+        """Returns the cached permanent failure for video_id if it has not expired."""
+        failed = self._failed_downloads.get(video_id)
+        return failed[1] if failed and failed[0] > time.monotonic() else None
+
+    def _trip_breaker(self):
+        """Opens the circuit breaker after a throttling response; repeated trips back off exponentially."""
+        if time.monotonic() < self._breaker_until:
+            # Уже открыт: параллельные загрузки с тем же 429/503 не удлиняют паузу
+            return
+        cooldown = min(BREAKER_MAX_COOLDOWN_S, BREAKER_BASE_COOLDOWN_S * 2 ** self._breaker_trips)
+        self._breaker_trips += 1
+        self._breaker_until = time.monotonic() + cooldown + random.uniform(0, 2)
+        logger.warning("[Download] YouTube throttling detected, pausing downloads for ~%.0fs", cooldown)
+
     async def download(self, video_id: str) -> DownloadResult:
-        """Download and convert video to MP3 for Telegram."""
-        logger.info(f"[Download] Starting download for {video_id} to {self._temp_dir}")
+        """Download a video as M4A/MP3 audio for Telegram; concurrent calls for one video share a run."""
+        failed = self._recent_failure(video_id)
+        if failed:
+            logger.info("[Download] %s failed recently, skipping: %s", video_id, failed.error)
+            return failed
+        
+        # Breaker общий для всех точек входа: и /play, и радио. Пауза может
+        # продлиться, пока мы ждём, поэтому проверяем её заново после сна
+        wait_until = time.monotonic() + BREAKER_MAX_WAIT_S
+        while (remaining := self._breaker_until - time.monotonic()) > 0:
+            if self._breaker_until > wait_until:
+                logger.warning("[Download] Circuit breaker open too long, skipping %s", video_id)
+                return DownloadResult(
+                    success=False,
+                    error="YouTube throttling cooldown: try again later"
+                )
+            logger.info("[Download] Circuit breaker open, waiting %.1fs before %s", remaining, video_id)
+            await asyncio.sleep(remaining)
+        
+        # Оба вызова всё равно писали бы в один и тот же <id>.m4a — второй ждёт первый
+        future = self._downloading.get(video_id)
+        if future is None:
+            future = asyncio.ensure_future(self._download_uncached(video_id))
+            self._downloading[video_id] = future
+            self._download_waiters[video_id] = 0
+        self._download_waiters[video_id] += 1
+        try:
+            result = await asyncio.shield(future)
+            if result.success:
+                # Вызывающие (чаты /play, радио с предзагрузкой) удаляют файл сами
+                # после отправки, поэтому каждый получает собственную копию
+                try:
+                    result = result.model_copy(update={'file_path': self._private_copy(result.file_path)})
+                except OSError as e:
+                    logger.error("[Download] Could not hand out %s: %s", result.file_path, e)
+                    return DownloadResult(success=False, error=f"Download error: {e}")
+        finally:
+            self._release_download(video_id, future)
+        
+        if result.success:
+            self._breaker_trips = 0
+            return result
+        error_kind = _classify_error(result.error)
+        if error_kind == 'permanent':
+            self._failed_downloads[video_id] = (time.monotonic() + FAILED_DOWNLOAD_TTL_S, result)
+            self._failed_downloads.move_to_end(video_id)
+            if len(self._failed_downloads) > FAILED_DOWNLOAD_MAX_SIZE:
+                self._failed_downloads.popitem(last=False)
+        elif error_kind == 'throttle':
+            self._trip_breaker()
+        return result
+
+    def _private_copy(self, file_path: Path) -> Path:
+        """Hard-links (or copies) a shared download to a name owned by a single caller."""
+        # '<id>-<n>' не начинается с '<id>.', поэтому _find_downloaded_file копии не видит
+        copy_path = file_path.with_name(f"{file_path.stem}-{next(self._copy_ids)}{file_path.suffix}")
+        try:
+            os.link(file_path, copy_path)
+        except OSError:
+            shutil.copyfile(file_path, copy_path)
+        return copy_path
+
+    def _release_download(self, video_id: str, future: asyncio.Future):
+        """Drops one waiter of a download; the last one removes the shared file."""
+        self._download_waiters[video_id] -= 1
+        if self._download_waiters[video_id]:
+            return
+        if future.done():
+            self._finish_download(video_id, future)
+        else:
+            # Все ожидающие отменены, а yt-dlp ещё работает — убираем файл по завершении
+            future.add_done_callback(functools.partial(self._finish_download, video_id))
+
+    def _finish_download(self, video_id: str, future: asyncio.Future):
+        """Forgets a finished download with no waiters left and deletes its shared file."""
+        if self._downloading.get(video_id) is not future or self._download_waiters[video_id]:
+            return
+        del self._downloading[video_id]
+        del self._download_waiters[video_id]
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if result.success and result.file_path:
+            try:
+                os.unlink(result.file_path)
+            except OSError as e:
+                logger.warning("[Download] Could not remove shared file %s: %s", result.file_path, e)
+
+    async def _download_uncached(self, video_id: str) -> DownloadResult:
+        """Runs the actual yt-dlp download and conversion."""
+        logger.info("[Download] Starting download for %s to %s", video_id, self._temp_dir_str)
         
         try:
             loop = asyncio.get_event_loop()
-            ydl_opts = self._download_opts.copy()
-            
-            def download_sync(): # Renamed to avoid confusion with async
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    # Сначала получаем метаданные
-                    info = ydl.extract_info(video_id, download=False)
-                    
-                    # Скачиваем и конвертируем
-                    ydl.download([video_id])
-                    
-                    return info
+            ydl_opts = self._get_opts(is_search=False)
             
-            info = await loop.run_in_executor(None, download_sync) # Used renamed function
+            # Скачиваем, конвертируем и ищем файл в одном вызове пула,
+            # чтобы stat/scandir не блокировали event loop
+            await self._request_budget.acquire(DOWNLOAD_REQUEST_CREDITS)
+            async with self._download_semaphore:
+                info, audio_file, file_size = await loop.run_in_executor(
+                    self._executor, self._download_sync, ydl_opts, video_id
+                )
             
             if not info:
                 return DownloadResult(
@@ -156,29 +662,30 @@ class YouTubeDownloader:
                     error="Could not get video info"
                 )
             
-            # Ищем созданный файл
-            pattern = str(self._temp_dir / f"{video_id}.*")
-            files = glob.glob(pattern)
-            
-            if not files:
+            if not audio_file:
+                if info.get('is_live'):
+                    return DownloadResult(
+                        success=False,
+                        error="Live streams are not supported"
+                    )
+                size = info.get('filesize') or info.get('filesize_approx')
+                if size and size > self._max_filesize:
+                    logger.warning("[Download] %s rejected before download: %d bytes", video_id, size)
+                    return DownloadResult(
+                        success=False,
+                        error=f"File is too large ({size // (1024 * 1024)} MB)"
+                    )
                 return DownloadResult(
                     success=False,
                     error="File not found after download"
                 )
             
-            # Находим MP3 файл
-            mp3_file = None
-            for file in files:
-                if file.endswith('.mp3'):
-                    mp3_file = file
-                    break
-            
-            if not mp3_file:
-                # If no MP3, fail
-                logger.error(f"[Download] No MP3 file found for {video_id} after download.")
+            if not audio_file.endswith(_AUDIO_EXTENSIONS):
+                # If no M4A/MP3, fail
+                logger.error("[Download] No M4A/MP3 file found for %s after download.", video_id)
                 return DownloadResult(
                     success=False,
-                    error="No MP3 file found after conversion."
+                    error="No M4A/MP3 file found after conversion."
                 )
             
             # Создаем TrackInfo
@@ -192,34 +699,137 @@ class YouTubeDownloader:
                 like_count=info.get('like_count'),
             )
             
-            # Проверяем размер файла
-            file_size = os.path.getsize(mp3_file)
-            logger.info(f"[Download] File downloaded: {mp3_file}, size: {file_size} bytes")
+            logger.info("[Download] File downloaded: %s, size: %d bytes", audio_file, file_size)
             
             return DownloadResult(
                 success=True,
-                file_path=Path(mp3_file), # Converted to Path object
+                file_path=Path(audio_file), # Converted to Path object
                 track_info=track_info
             )
             
         except yt_dlp.utils.DownloadError as e:
-            logger.error(f"[Download] Download error for {video_id}: {e}")
+            logger.error("[Download] Download error for %s: %s", video_id, e)
             return DownloadResult(
                 success=False,
                 error=str(e)
             )
         except Exception as e:
-            logger.error(f"[Download] Unexpected error for {video_id}: {e}", exc_info=True)
+            logger.error("[Download] Unexpected error for %s: %s", video_id, e, exc_info=True)
             return DownloadResult(
                 success=False,
                 error=f"Download error: {str(e)}"
             )
 
+    async def _resolve_track(self, query: str) -> Optional[TrackInfo]:
+        """Returns the best search hit for a free-text track query."""
+        tracks = await self.search(
+            query,
+            limit=5,
+            search_mode='track',
+            min_duration=self._settings.TRACK_MIN_DURATION_S,
+            max_duration=self._settings.TRACK_MAX_DURATION_S,
+        )
+        # Видео с недавней постоянной ошибкой пропускаем: у популярных треков
+        # обычно есть другие загрузки
+        return next((t for t in tracks if not self._recent_failure(t.identifier)), None)
+
+    async def _resolve_video_id(self, query: str) -> Optional[str]:
+        """Maps a free-text query to a video id, reusing earlier answers and in-flight searches."""
+        key = _normalize_query(query)
+        cached = self._query_aliases.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        # Single-flight: одинаковые одновременные запросы ждут один поиск
+        future = self._resolving.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._resolve_track(query))
+            self._resolving[key] = future
+            future.add_done_callback(lambda _: self._resolving.pop(key, None))
+        track = await asyncio.shield(future)
+        if not track:
+            return None
+        
+        if len(self._query_aliases) >= QUERY_ALIAS_MAX_SIZE:
+            self._query_aliases.pop(next(iter(self._query_aliases)), None)
+        self._query_aliases[key] = (time.monotonic() + QUERY_ALIAS_TTL_S, track.identifier)
+        return track.identifier
+
+    def _find_downloaded_file(self, video_id: str) -> Optional[str]:
+        """Returns the best downloaded file for video_id using a single directory pass."""
+        # FFmpegExtractAudio всегда пишет <id>.m4a — обычно хватает одного stat
+        m4a_path = os.path.join(self._temp_dir_str, video_id + '.m4a')
+        if os.path.isfile(m4a_path):
+            return m4a_path
+        
+        prefix = video_id + '.'
+        best_priority, best_path = 99, None
+        with os.scandir(self._temp_dir_str) as entries:
+            for entry in entries:
+                name = entry.name
+                if not name.startswith(prefix):
+                    continue
+                ext = os.path.splitext(name)[1]
+                if ext in _SIDECAR_EXTENSIONS:
+                    continue
+                priority = _FILE_EXT_PRIORITY.get(ext, 10)
+                if priority == 0:
+                    # M4A лучше любого кандидата — дальше сканировать незачем
+                    return entry.path
+                if priority < best_priority:
+                    best_priority, best_path = priority, entry.path
+        return best_path
+
     async def download_with_retry(self, query_or_id: str, max_retries: int = 3) -> DownloadResult:
         """Download with retry logic."""
+        last_error = None
         for attempt in range(max_retries):
+            if time.monotonic() < self._breaker_until:
+                logger.warning("[Download] Circuit breaker open, skipping '%s'", query_or_id)
+                return DownloadResult(
+                    success=False,
+                    error=f"YouTube throttling cooldown: {last_error or 'try again later'}"
+                )
+            
             try:
                 # Проверяем, является ли query ID видео
                 video_id = None
-                if re.match(r'^[a-zA-Z0-9_-]{11}$', query_or_id):
-                    video_id = query_or_id
\ No newline at end of file
+                if _is_video_id(query_or_id):
+                    video_id = query_or_id
+                else:
+                    video_id = await self._resolve_video_id(query_or_id)
+                    if not video_id:
+                        return DownloadResult(
+                            success=False,
+                            error="Ничего не найдено"
+                        )
+                
+                result = await self.download(video_id)
+                if result.success:
+                    return result
+                
+                last_error = result.error
+                error_kind = _classify_error(result.error)
+                if error_kind in ('too_big', 'permanent'):
+                    if error_kind == 'permanent' and video_id != query_or_id:
+                        # Запрос больше не должен вести на недоступное видео:
+                        # следующий /play с тем же текстом выполнит новый поиск
+                        self._query_aliases.pop(_normalize_query(query_or_id), None)
+                    # Повтор не поможет: видео удалено/закрыто или файл слишком большой
+                    return result
+                logger.warning("[Download] Attempt %d/%d failed for '%s': %s", attempt + 1, max_retries, query_or_id, result.error)
+            except Exception as e:
+                last_error = str(e)
+                logger.error("[Download] Attempt %d/%d crashed for '%s': %s", attempt + 1, max_retries, query_or_id, e, exc_info=True)
+            
+            if time.monotonic() < self._breaker_until:
+                # download() открыл breaker — следующая итерация завершится сразу, без задержки
+                continue
+            if attempt < max_retries - 1:
+                # Экспоненциальная задержка с jitter, чтобы повторы не шли синхронно
+                await asyncio.sleep(min(RETRY_MAX_DELAY_S, RETRY_BASE_DELAY_S * 2 ** attempt) + random.random())
+        
+        return DownloadResult(
+            success=False,
+            error=f"Failed after {max_retries} attempts: {last_error}"
+        )